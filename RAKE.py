@@ -1,8 +1,103 @@
-import rake
-import operator
+from collections import Counter
+from functools import lru_cache
+import math
+import re
+import sys
+import numpy as np
+
+# Characters that end a candidate phrase, as in the rake package
+phrase_delimiters = '[\\[\\]\n.!?,;:\t\\-"()\'\u2019\u2013]'
+word_pattern = re.compile(r'[\w+/]+')
+
+
+@lru_cache(maxsize=None)
+def load_stoplist(path=None):
+    """Read a stoplist file, one word per line and # for comments, or get spaCy's English stop words"""
+    if path is None:
+        from spacy.lang.en.stop_words import STOP_WORDS
+        return frozenset(word.lower() for word in STOP_WORDS)
+    with open(path, encoding='utf8') as f:
+        return frozenset(line.strip().lower() for line in f if line.strip() and not line.startswith('#'))
+
+
+def trie_pattern(words):
+    """Get a regular expression matching any of words, factored as a trie"""
+    trie = dict()
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, dict())
+        node[''] = True
+
+    def pattern(node):
+        end = '' in node
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return '(?:' + body + ')?' if end else body
+
+    return pattern(trie)
+
+
+@lru_cache(maxsize=None)
+def load_splitter(path=None):
+    """Compile the stoplist once into a single pattern splitting text into candidate phrases
+
+    Compiled objects are cached at module level, so loading them before
+    forking shares them read-only with every worker.
+    """
+    stopwords = trie_pattern(load_stoplist(path))
+    return re.compile(phrase_delimiters + '|(?<!\\w)' + stopwords + '(?!\\w)')
+
+
+class Rake():
+    """Rapid Automatic Keyword Extraction, a drop-in for rake.Rake"""
+
+    def __init__(self, stoplist_path=None):
+        self.splitter = load_splitter(stoplist_path)
+
+    def candidate_phrases(self, text):
+        """Split text at delimiters and stop words into candidate phrases"""
+        return [phrase for phrase in (piece.strip() for piece in self.splitter.split(text.lower())) if phrase]
+
+    def score_phrases(self, phrases):
+        """Get {phrase: score}, summing degree / frequency of the words of each phrase"""
+        counts = Counter(phrases)
+        vocab = dict()  # word -> interned id
+        ids = [[vocab.setdefault(word, len(vocab)) for word in word_pattern.findall(phrase) if not word.isdigit()]
+               for phrase in counts]
+        lengths = np.array([len(phrase_ids) for phrase_ids in ids], dtype=np.int64)
+        flat = np.fromiter((i for phrase_ids in ids for i in phrase_ids), dtype=np.int64, count=int(lengths.sum()))
+        # Every occurrence of a phrase adds to each of its words' frequency and degree
+        occurrences = np.repeat(np.fromiter(counts.values(), dtype=np.float64, count=len(counts)), lengths)
+        frequency = np.bincount(flat, weights=occurrences, minlength=len(vocab))
+        degree = np.bincount(flat, weights=occurrences * np.repeat(lengths - 1, lengths), minlength=len(vocab))
+        word_score = (degree + frequency) / np.maximum(frequency, 1)
+        scores = np.bincount(np.repeat(np.arange(len(ids)), lengths), weights=word_score[flat], minlength=len(ids))
+        return dict(zip(counts, scores.tolist()))
+
+    def run(self, text):
+        """Get (phrase, score) pairs of text, best first"""
+        scores = self.score_phrases(self.candidate_phrases(text))
+        return sorted(scores.items(), key=lambda t: t[1], reverse=True)
+
+    def run_corpus(self, texts):
+        """Get (phrase, score) pairs of each text, weighting scores by the phrase's inverse document frequency
+
+        Phrases common to the whole corpus, like party names in a series of
+        judgments, sink below the phrases particular to each document.
+        """
+        documents = [self.score_phrases(self.candidate_phrases(text)) for text in texts]
+        frequency = Counter(phrase for scores in documents for phrase in scores)
+        results = []
+        for scores in documents:
+            weighted = [(phrase, score * (math.log((1 + len(documents)) / (1 + frequency[phrase])) + 1))
+                        for phrase, score in scores.items()]
+            results.append(sorted(weighted, key=lambda t: t[1], reverse=True))
+        return results
+
 
-filepath = "keyword_extraction.txt"
-rake_object = rake.Rake(filepath)
 text ='''The plaintiff filed this action for a declaration of title to premises No. 75, Sea Street, Galle, for ejectment of the defendant from the said premises and for damages at the rate of Rs. 30/- per month from 3.5.66 until restoration of possession.
  One Amaradasa had been the owner of the premises and Lucihamy was in occupation of it as his tenant. In April 1964, Amaradasa sold and conveyed the premises to the plaintiff for a consideration provided by A. M. N. Sideek, the father of the plaintiff. The plaintiff was at the time a student in the H.S.C. class.
  The plaintiff's case was that Mr. A. H. Jamaldeen, the Notary who attested the deed of conveyance in his favour wrote to Lucihamy informing her of the transfer by Amaradasa to the plaintiff: that Lucihamy came one day to Jamaldeen's office and plaintiff also came there and that Lucihamy agreed to accept the plaintiff as landlord and to pay rent to him. Rents were paid by Lucihamy in the shop of the plaintiff's father and receipts have been signed by the plaintiff's brother. The plaintiff further averred that Lucihamy died on the 3rd May, 1966 and the defendant, who is the daughter of Lucihamy, refused to vacate the premises and is in unlawful occupation of it.
@@ -74,7 +169,12 @@ https://www.lawlanka.com/lal/pages/popUp/printNLRCaseReportPopUp.jsp?caseId=NLR8
 shall, if such action or proceedings is or are pending on the date of commencement of this Act, be deemed at all times to have been and to be null and void;
 Accordingly I allow the appeal, set aside the judgment and decree of the District Court and direct that order be entered dismissing plaintiff's action. The defendant-appellant will be entitled to her costs in both Courts.
 '''
-sample_file = open(“data/docs/fao_test/w2167e.txt”, ‘r’)
-text = sample_file.read()
-keywords = rake_object.run(text)
-print (“Keywords:”, keywords)
+
+if __name__ == '__main__':
+    # python RAKE.py [document.txt [stoplist.txt]]
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf8') as sample_file:
+            text = sample_file.read()
+    rake_object = Rake(sys.argv[2] if len(sys.argv) > 2 else None)
+    keywords = rake_object.run(text)
+    print("Keywords:", keywords[:10])
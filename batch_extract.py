@@ -0,0 +1,187 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+import uuid
+import extractors
+
+
+def find_files(inputs, pattern='*.txt'):
+    """Get the sorted text files named by inputs, each a file, a directory or a glob"""
+    files = set()
+    for source in inputs:
+        if os.path.isdir(source):
+            files.update(glob.glob(os.path.join(source, '**', pattern), recursive=True))
+        elif os.path.isfile(source):
+            files.add(source)
+        else:
+            files.update(glob.glob(source, recursive=True))
+    return sorted(os.path.abspath(file) for file in files)
+
+
+def process_file(job):
+    """Run every extractor over one file, in a worker process"""
+    path, names, number = job
+    record = {'path': path, 'keywords': dict(), 'seconds': dict()}
+    try:
+        with open(path, encoding='utf8', errors='replace') as f:
+            text = f.read()
+        for name in names:
+            start = time.perf_counter()
+            record['keywords'][name] = extractors.extract(name, text, number)
+            record['seconds'][name] = time.perf_counter() - start
+    except Exception as e:
+        record['error'] = repr(e)
+    return record
+
+
+class jsonl_writer():
+    """Append records to a JSON lines file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'a', encoding='utf8')
+
+    def write(self, record):
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+        return [] if 'error' in record else [record['path']]
+
+    def close(self):
+        self.file.close()
+        return []
+
+
+class parquet_writer():
+    """Write records to a Parquet dataset directory, one closed part file per row group
+
+    A Parquet file cannot be read before its footer is written on close, so
+    each row group gets a file of its own, renamed into place once complete.
+    """
+
+    def __init__(self, path, row_group_size=1000):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.prefix = 'part-%d-%s' % (time.time(), uuid.uuid4().hex[:8])
+        self.parts = 0
+        self.row_group_size = row_group_size
+        self.rows = []
+
+    def write(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= self.row_group_size:
+            return self.flush()
+        return []
+
+    def flush(self):
+        """Write the buffered rows, returning the paths that are now durable"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        if not self.rows:
+            return []
+        table = pa.Table.from_pylist([{'path': row['path'],
+                                       'keywords': json.dumps(row['keywords']),
+                                       'seconds': json.dumps(row['seconds']),
+                                       'error': row.get('error')} for row in self.rows],
+                                     schema=pa.schema([('path', pa.string()), ('keywords', pa.string()),
+                                                       ('seconds', pa.string()), ('error', pa.string())]))
+        name = '%s-%05d.parquet' % (self.prefix, self.parts)
+        # Readers skip hidden files, so a part cut short by a crash is never picked up
+        temporary = os.path.join(self.path, '.' + name + '.tmp')
+        pq.write_table(table, temporary)
+        os.replace(temporary, os.path.join(self.path, name))
+        self.parts += 1
+        done = [row['path'] for row in self.rows if 'error' not in row]
+        self.rows = []
+        return done
+
+    def close(self):
+        return self.flush()
+
+
+class checkpoint():
+    """Paths already written, so an interrupted run can resume where it stopped
+
+    Each line holds the extractors a path was run with and the path, so a
+    later run with other extractors does not skip it.
+    """
+
+    def __init__(self, path, names):
+        self.key = ','.join(sorted(set(names)))
+        self.done = set()
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as f:
+                for line in f:
+                    key, _, done = line.rstrip('\n').partition('\t')
+                    if key == self.key:
+                        self.done.add(done)
+        self.file = open(path, 'a', encoding='utf8')
+
+    def mark(self, paths):
+        for path in paths:
+            self.file.write(self.key + '\t' + path + '\n')
+        if paths:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run(inputs, names, output, output_format='jsonl', number=5, pattern='*.txt',
+        workers=None, chunksize=4, log=sys.stderr, log_every=5.0):
+    """Extract keywords from every file with every named extractor across a process pool
+
+    Finished paths are recorded in output + '.checkpoint' once their results
+    are on disk, and are skipped when run again with the same extractors.
+    Paths that failed still get a row, carrying 'error', but are not recorded
+    and so are retried: a path can have several rows, and the last is current.
+    """
+    # Load the models here first: a worker whose initializer raises is just respawned, forever
+    extractors.warmup(names)
+    done = checkpoint(output.rstrip(os.sep) + '.checkpoint', names)
+    files = [path for path in find_files(inputs, pattern) if path not in done.done]
+    writer = parquet_writer(output) if output_format == 'parquet' else jsonl_writer(output)
+    log.write('%d files to process, %d already done\n' % (len(files), len(done.done)))
+
+    start = last_log = time.perf_counter()
+    count = 0
+    pool = multiprocessing.Pool(workers, initializer=extractors.warmup, initargs=(names,))
+    try:
+        jobs = ((path, names, number) for path in files)
+        for record in pool.imap_unordered(process_file, jobs, chunksize):
+            done.mark(writer.write(record))
+            count += 1
+            now = time.perf_counter()
+            if now - last_log >= log_every:
+                log.write('%d/%d files, %.2f docs/sec\n' % (count, len(files), count / (now - start)))
+                last_log = now
+        pool.close()
+    finally:
+        pool.terminate()
+        done.mark(writer.close())
+        done.close()
+    elapsed = time.perf_counter() - start
+    log.write('%d files in %.1fs, %.2f docs/sec\n' % (count, elapsed, count / elapsed if elapsed else 0.0))
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Extract keywords from a corpus of text files')
+    parser.add_argument('inputs', nargs='+', help='text files, directories or globs')
+    parser.add_argument('-e', '--extractor', action='append', dest='extractors',
+                        choices=sorted(extractors.extractors), help='may be repeated, default txtrank')
+    parser.add_argument('-o', '--output', required=True, help='JSONL file, or directory for parquet')
+    parser.add_argument('--format', default='jsonl', choices=['jsonl', 'parquet'])
+    parser.add_argument('-n', '--number', type=int, default=10, help='keywords per extractor and file')
+    parser.add_argument('--pattern', default='*.txt', help='files to pick from directories')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes, default one per CPU')
+    parser.add_argument('--chunksize', type=int, default=4, help='files handed to a worker at a time')
+    args = parser.parse_args(argv)
+    run(args.inputs, args.extractors or ['txtrank'], args.output, args.format, args.number, args.pattern,
+        args.workers, args.chunksize)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from chunks import sentence_end
+
+default_sizes = [1000, 10000, 100000, 1000000, 10000000]
+modules = ['txtrank', 'textRank', 'topicRank']
+extractor_names = ['rake', 'rake_package', 'summa', 'topicrank']
+
+
+def make_corpus(size, seed=0):
+    """Get about size characters of the embedded judgment, its sentences shuffled and repeated"""
+    import txtrank
+    sentences = [s for s in sentence_end.split(txtrank.text) if s.strip()]
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        rng.shuffle(sentences)
+        for sentence in sentences:
+            parts.append(sentence)
+            length += len(sentence) + 1
+            if length >= size:
+                break
+    return ' '.join(parts)[:size]
+
+
+def txtrank_stages(text):
+    """Run txtrank.analyze stage by stage, timing each"""
+    import txtrank
+    tr = txtrank.txtrank()
+    nlp = txtrank.load_nlp()
+    nlp.max_length = max(nlp.max_length, len(text) + 1)
+    tr.set_stopwords(list())
+    seconds = dict()
+
+    def timed(stage, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        seconds[stage] = time.perf_counter() - start
+        return result
+
+    doc = timed('nlp', nlp, text)
+    sentences = timed('sentence_segment', tr.sentence_segment, doc, ['NOUN', 'PROPN'], False)
+    vocab = timed('get_vocab', tr.get_vocab, sentences)
+    token_ids, sentence_ids = timed('get_token_ids', tr.get_token_ids, vocab, sentences)
+    token_pairs = timed('get_token_pairs', tr.get_token_pairs, 4, token_ids, sentence_ids)
+    g = timed('get_matrix', tr.get_matrix, vocab, token_pairs)
+    result = timed('iteration', tr.get_solver().solve, g)
+    counts = {'tokens': len(doc), 'vocab': len(vocab), 'pairs': len(token_pairs[0]), 'nnz': int(g.nnz),
+              'iterations': result.iterations}
+    return seconds, counts
+
+
+def extractor_total(name, text):
+    """Run one extractor end to end"""
+    import extractors
+    extractors.warmup([name])
+    start = time.perf_counter()
+    extractors.extract(name, text, 10)
+    return {'total': time.perf_counter() - start}, dict()
+
+
+def rake_package_total(text):
+    """Run the external rake package end to end, on the same stoplist as the in-tree RAKE"""
+    import tempfile
+    import rake
+    import RAKE
+    with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+        f.write('\n'.join(sorted(RAKE.load_stoplist())) + '\n')
+    rake_object = rake.Rake(f.name)
+    os.remove(f.name)
+    start = time.perf_counter()
+    rake_object.run(text)
+    return {'total': time.perf_counter() - start}, dict()
+
+
+def run_case(case, size, repeat, seed):
+    """Benchmark one case in this (fresh) process, returning its timings and memory use"""
+    text = make_corpus(size, seed)
+    if case == 'txtrank':
+        function, args = txtrank_stages, (text,)
+    elif case == 'rake_package':
+        function, args = rake_package_total, (text,)
+    else:
+        function, args = extractor_total, (case, text)
+    try:
+        function(*args)  # warm up models and caches
+        runs = [function(*args) for i in range(repeat)]
+        tracemalloc.start()
+        function(*args)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    except (ImportError, OSError) as e:
+        # extractor package or spaCy model not installed
+        return {'skipped': repr(e)}
+    seconds = {stage: min(run[0][stage] for run in runs) for stage in runs[0][0]}
+    return {'seconds': seconds, 'counts': runs[0][1], 'peak_alloc_bytes': peak,
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}
+
+
+def import_time(module, repeat):
+    """Get the best cold import time of module in a new interpreter"""
+    code = 'import time; start = time.perf_counter(); import %s; print(time.perf_counter() - start)' % module
+    here = os.path.dirname(os.path.abspath(__file__))
+    return min(float(subprocess.check_output([sys.executable, '-c', code], cwd=here)) for i in range(repeat))
+
+
+def run(cases, sizes, repeat=3, seed=0, log=sys.stderr):
+    """Run every case at every size, each in its own process so peak RSS is its own"""
+    results = dict()
+    for module in modules:
+        results['import/%s' % module] = {'seconds': {'import': import_time(module, repeat)}}
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        for size in sizes:
+            with ProcessPoolExecutor(1, mp_context=context) as pool:
+                result = pool.submit(run_case, case, size, repeat, seed).result()
+            results['%s/%d' % (case, size)] = result
+            log.write('%s/%d %s\n' % (case, size, json.dumps(result.get('seconds', result))))
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'repeat': repeat,
+            'seed': seed, 'results': results}
+
+
+def compare(report, baseline, threshold=0.2, min_seconds=0.005):
+    """Get the stages that got slower than baseline by more than threshold
+
+    A stage must also be at least min_seconds slower, so jitter in stages of
+    a millisecond or less is not taken for a regression.
+    """
+    regressions = []
+    for key, result in report['results'].items():
+        old = baseline['results'].get(key, dict()).get('seconds', dict())
+        for stage, seconds in result.get('seconds', dict()).items():
+            if stage in old and seconds > old[stage] * (1 + threshold) and seconds - old[stage] >= min_seconds:
+                regressions.append((key, stage, old[stage], seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the keyword extractors on synthetic judgments')
+    parser.add_argument('--cases', nargs='+', default=['txtrank'] + extractor_names,
+                        choices=['txtrank'] + extractor_names)
+    parser.add_argument('--sizes', nargs='+', type=int, default=default_sizes, help='corpus sizes in characters')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the fastest is kept')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', default='-', help='JSON report, - for stdout')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 is 20%%')
+    parser.add_argument('--min-seconds', type=float, default=0.005,
+                        help='smallest slowdown in seconds counted as a regression')
+    args = parser.parse_args(argv)
+
+    report = run(args.cases, args.sizes, args.repeat, args.seed)
+    if args.output == '-':
+        json.dump(report, sys.stdout, indent=1)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold, args.min_seconds)
+        for key, stage, old, new in regressions:
+            sys.stderr.write('regression %s %s: %.4fs -> %.4fs\n' % (key, stage, old, new))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
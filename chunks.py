@@ -0,0 +1,48 @@
+import re
+import string
+
+sentence_end = re.compile(r'(?<=[.!?])\s+')
+
+
+def read_chunks(source, chunk_size=100000):
+    """Yield text of at most chunk_size characters from a file object, a string or an iterable of pages
+
+    Pages are joined with a newline, and chunks are cut after their last
+    whitespace so a word is only split when it is longer than chunk_size.
+    """
+    if hasattr(source, 'read'):
+        pieces = iter(lambda: source.read(chunk_size), '')
+        separator = ''
+    else:
+        pieces = [source] if isinstance(source, str) else source
+        separator = '\n'
+    buffer = ''
+    for i, piece in enumerate(pieces):
+        buffer = buffer + separator + piece if i else piece
+        start = 0
+        while len(buffer) - start > chunk_size:
+            end = start + chunk_size
+            cut = max(buffer.rfind(space, start, end) for space in string.whitespace) + 1
+            if cut <= start:
+                cut = end
+            yield buffer[start:cut]
+            start = cut
+        buffer = buffer[start:]
+    if buffer:
+        yield buffer
+
+
+def sentence_chunks(text, max_chars=5000):
+    """Split text into chunks of at most max_chars characters, cutting between sentences where possible"""
+    chunk = ''
+    for sentence in sentence_end.split(text):
+        if chunk and len(chunk) + 1 + len(sentence) > max_chars:
+            yield chunk
+            chunk = ''
+        # A single sentence longer than max_chars is cut wherever it has to be
+        while len(sentence) > max_chars:
+            yield sentence[:max_chars]
+            sentence = sentence[max_chars:]
+        chunk = chunk + ' ' + sentence if chunk else sentence
+    if chunk:
+        yield chunk
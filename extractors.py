@@ -0,0 +1,76 @@
+import RAKE
+import textRank
+import topicRank
+import txtrank
+
+ranker = None  # txtrank instance reused by every call in this process
+rake_stoplist = None  # stoplist file for RAKE, None for spaCy's English stop words
+rake_object = None  # RAKE.Rake reused by every call in this process
+
+
+def load_rake():
+    """Get the process wide RAKE.Rake, compiling the stoplist on first use"""
+    global rake_object
+    if rake_object is None:
+        rake_object = RAKE.Rake(rake_stoplist)
+    return rake_object
+
+
+def rake_keywords(text, number=5):
+    """Get top keywords with RAKE"""
+    return [keyword for keyword, score in load_rake().run(text)[:number]]
+
+
+def summa_keywords(text, number=5):
+    """Get top keywords with summa's TextRank"""
+    return textRank.get_keywords(text, words=number)
+
+
+def topicrank_keywords(text, number=5):
+    """Get top keywords with pytopicrank"""
+    return topicRank.get_keywords(text, n=number)
+
+
+def get_ranker():
+    """Get the process wide txtrank"""
+    global ranker
+    if ranker is None:
+        ranker = txtrank.txtrank()
+    return ranker
+
+
+def txtrank_keywords(text, number=5):
+    """Get top keywords with txtrank"""
+    tr = get_ranker()
+    tr.analyze(text)
+    return [keyword for keyword, weight in tr.top_keywords(number)]
+
+
+# name -> (function of text and number returning keywords best first, warmup)
+extractors = {
+    'rake': (rake_keywords, load_rake),
+    'summa': (summa_keywords, textRank.warmup),
+    'topicrank': (topicrank_keywords, topicRank.warmup),
+    'txtrank': (txtrank_keywords, lambda: txtrank.warmup(batch=False)),
+}
+
+
+def extract(name, text, number=5):
+    """Get top number keywords of text with the extractor called name"""
+    return extractors[name][0](text, number)
+
+
+def warmup(names):
+    """Load what the named extractors need, e.g. as a worker process initializer"""
+    for name in names:
+        extractors[name][1]()
+
+
+def extract_many(name, texts, number=5):
+    """Get top number keywords of each of texts, txtrank parsing them as one nlp.pipe batch"""
+    if name != 'txtrank':
+        return [extract(name, text, number) for text in texts]
+    keywords = []
+    for node_weight in get_ranker().analyze_many(texts, batch_size=max(len(texts), 1)):
+        keywords.append(sorted(node_weight, key=node_weight.get, reverse=True)[:number])
+    return keywords
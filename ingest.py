@@ -0,0 +1,197 @@
+import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import hashlib
+import json
+import os
+import sys
+import extractors
+
+retry_statuses = {429, 500, 502, 503, 504}
+max_retry_after = 60.0  # longest Retry-After, in seconds, a server can make fetch wait
+
+
+class html_cache():
+    """On-disk copy of fetched pages with the validators needed for conditional requests"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def file(self, url):
+        return os.path.join(self.path, hashlib.sha256(url.encode('utf8')).hexdigest())
+
+    def load(self, url):
+        """Get (html, validators) cached for url, or (None, {})"""
+        file = self.file(url)
+        try:
+            with open(file + '.json') as f:
+                meta = json.load(f)
+            with open(file + '.html', 'rb') as f:
+                return f.read(), meta
+        except (FileNotFoundError, ValueError):
+            return None, {}
+
+    def store(self, url, html, headers):
+        """Save html with the ETag and Last-Modified it was served with"""
+        file = self.file(url)
+        meta = {'url': url, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        for suffix, data, mode in (('.html', html, 'wb'), ('.json', json.dumps(meta), 'w')):
+            # Write then rename, so a crash never leaves a partial page behind
+            with open(file + suffix + '.tmp', mode) as f:
+                f.write(data)
+            os.replace(file + suffix + '.tmp', file + suffix)
+
+
+def retry_after(headers, default):
+    """Get the seconds to wait before retrying, from a Retry-After of seconds or an HTTP date"""
+    value = headers.get('Retry-After')
+    if value is None:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+        except (TypeError, ValueError):
+            return default
+    return min(max(seconds, 0.0), max_retry_after)
+
+
+async def fetch(session, url, cache, retries=3, backoff=0.5):
+    """Get the html of url, revalidating the cached copy and retrying transient failures
+
+    Retries back off exponentially unless the server says how long to wait
+    with Retry-After. A truncated body is retried like a dropped connection.
+    """
+    import aiohttp
+    cached, meta = cache.load(url)
+    headers = dict()
+    if cached is not None:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    for attempt in range(retries + 1):
+        delay = backoff * 2 ** attempt
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304 and cached is not None:
+                    return cached
+                if response.status not in retry_statuses or attempt == retries:
+                    response.raise_for_status()
+                    html = await response.read()
+                    cache.store(url, html, response.headers)
+                    return html
+                delay = retry_after(response.headers, delay)
+        except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+        await asyncio.sleep(delay)
+
+
+def clean_text(html):
+    """Extract the main text of a page the way the scripts always have"""
+    import trafilatura
+    text = trafilatura.extract(html) or ''
+    return text.replace("\n", " ").replace("\'", "")
+
+
+async def run(links, extractor='summa', output=sys.stdout, number=5, cache_dir='html_cache',
+              connections=16, per_host=4, queue_size=32, workers=None, retries=3):
+    """Fetch, extract and rank every link concurrently, writing one JSON line per link to output
+
+    Pages are fetched over a pooled session of at most connections sockets
+    (per_host for any one host), extracted with trafilatura in a process
+    pool and handed to the keyword stage through a queue of queue_size
+    texts, which holds the fetchers back while the extractors catch up.
+    """
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    cache = html_cache(cache_dir)
+    texts = asyncio.Queue(maxsize=queue_size)
+    pending = iter(links)
+
+    def write(record):
+        output.write(json.dumps(record) + '\n')
+        output.flush()
+
+    async def fetcher(session, pool):
+        for url in pending:
+            try:
+                html = await fetch(session, url, cache, retries)
+                text = await loop.run_in_executor(pool, clean_text, html)
+            except Exception as e:
+                write({'url': url, 'error': repr(e)})
+                continue
+            await texts.put((url, text))
+
+    async def ranker(pool):
+        while True:
+            item = await texts.get()
+            if item is None:
+                return
+            url, text = item
+            try:
+                keywords = await loop.run_in_executor(pool, extractors.extract, extractor, text, number)
+            except Exception as e:
+                write({'url': url, 'error': repr(e)})
+                continue
+            write({'url': url, 'extractor': extractor, 'keywords': keywords})
+
+    with ProcessPoolExecutor(workers, initializer=extractors.warmup, initargs=([extractor],)) as pool:
+        connector = aiohttp.TCPConnector(limit=connections, limit_per_host=per_host)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            rankers = [asyncio.create_task(ranker(pool)) for i in range(workers or os.cpu_count() or 1)]
+            await asyncio.gather(*(fetcher(session, pool) for i in range(connections)))
+            for task in rankers:
+                await texts.put(None)
+            await asyncio.gather(*rankers)
+
+
+async def fetch_all(links, cache_dir='html_cache', connections=16, per_host=4, workers=None, retries=3):
+    """Fetch and extract every link concurrently, returning the cleaned texts in link order"""
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    cache = html_cache(cache_dir)
+    with ProcessPoolExecutor(workers) as pool:
+        connector = aiohttp.TCPConnector(limit=connections, limit_per_host=per_host)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async def get(url):
+                html = await fetch(session, url, cache, retries)
+                return await loop.run_in_executor(pool, clean_text, html)
+            return await asyncio.gather(*(get(url) for url in links))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch pages and write their keywords as JSON lines')
+    parser.add_argument('links', nargs='*', help='URLs to fetch')
+    parser.add_argument('--links-file', help='file with one URL per line')
+    parser.add_argument('--extractor', default='summa', choices=sorted(extractors.extractors))
+    parser.add_argument('--number', type=int, default=5, help='keywords per page')
+    parser.add_argument('--output', default='-', help='JSONL file to append to, - for stdout')
+    parser.add_argument('--cache-dir', default='html_cache')
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--per-host', type=int, default=4)
+    parser.add_argument('--queue-size', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=None, help='extraction processes, default one per CPU')
+    parser.add_argument('--retries', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    links = list(args.links)
+    if args.links_file:
+        with open(args.links_file) as f:
+            links.extend(line.strip() for line in f if line.strip())
+    output = sys.stdout if args.output == '-' else open(args.output, 'a')
+    try:
+        asyncio.run(run(links, args.extractor, output, args.number, args.cache_dir, args.connections,
+                        args.per_host, args.queue_size, args.workers, args.retries))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
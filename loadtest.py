@@ -0,0 +1,79 @@
+import argparse
+import http.client
+import json
+import random
+import sys
+import threading
+import time
+from chunks import sentence_end
+
+
+def make_texts(count, sentences_per_text=20, seed=0):
+    """Get count texts of sentences drawn from the judgment embedded in txtrank"""
+    import txtrank
+    sentences = [s for s in sentence_end.split(txtrank.text) if s.strip()]
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(sentences) for i in range(sentences_per_text)) for j in range(count)]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(fraction * len(values)), len(values) - 1)] if values else float('nan')
+
+
+def run(host, port, extractor, concurrency=16, requests=1000, number=10):
+    """Send requests from concurrency threads over keep-alive connections, timing each"""
+    texts = make_texts(min(requests, 200))
+    latencies = []
+    statuses = dict()
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def client():
+        connection = http.client.HTTPConnection(host, port)
+        for i in counter:
+            body = json.dumps({'text': texts[i % len(texts)], 'extractor': extractor, 'number': number})
+            start = time.perf_counter()
+            try:
+                connection.request('POST', '/keywords', body, {'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException) as e:
+                # Count the failure under the exception's name and reconnect for the next request
+                status = type(e).__name__
+                connection.close()
+                connection = http.client.HTTPConnection(host, port)
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+        connection.close()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {'requests': requests, 'concurrency': concurrency, 'seconds': elapsed,
+            'requests_per_sec': len(latencies) / elapsed, 'statuses': statuses,
+            'p50_ms': percentile(latencies, 0.5) * 1000, 'p99_ms': percentile(latencies, 0.99) * 1000}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test the keyword service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('-e', '--extractor', default='txtrank')
+    parser.add_argument('-c', '--concurrency', type=int, default=16)
+    parser.add_argument('-n', '--requests', type=int, default=1000)
+    args = parser.parse_args(argv)
+    json.dump(run(args.host, args.port, args.extractor, args.concurrency, args.requests), sys.stdout, indent=1)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import threading
+import time
+
+# Upper bounds in seconds of the per document histogram buckets
+default_buckets = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, float('inf'))
+# Counters that make no sense summed over documents, exported only as gauges
+non_additive = ('residual',)
+
+
+class instrument():
+    """Per stage timings and counters of each document txtrank analyzes
+
+    Every finished document record is passed to each exporter, any callable
+    taking the record. stage_hooks are called as hook(stage, seconds, record)
+    as soon as a stage ends.
+    """
+
+    def __init__(self, exporters=(), stage_hooks=()):
+        self.exporters = list(exporters)
+        self.stage_hooks = list(stage_hooks)
+        self.current = None  # record of the document being analyzed
+
+    def begin(self):
+        """Start the record of a new document"""
+        self.current = {'stages': dict(), 'counters': dict(), 'start': time.perf_counter()}
+        return self.current
+
+    def detach(self):
+        """Set the current record aside, e.g. while the rest of a batch is built"""
+        record, self.current = self.current, None
+        return record
+
+    def attach(self, record):
+        self.current = record
+
+    def timed(self, stage, function, *args):
+        """Call function(*args), adding its time to stage"""
+        start = time.perf_counter()
+        result = function(*args)
+        self.add(stage, time.perf_counter() - start)
+        return result
+
+    def add(self, stage, seconds):
+        """Add seconds measured elsewhere, e.g. a share of a batch, to stage"""
+        stages = self.current['stages']
+        stages[stage] = stages.get(stage, 0.0) + seconds
+        for hook in self.stage_hooks:
+            hook(stage, seconds, self.current)
+
+    def count(self, **counters):
+        self.current['counters'].update(counters)
+
+    def finish(self, seconds=None):
+        """Hand the current record to the exporters
+
+        seconds defaults to the wall time since begin(), which overstates a
+        document analyzed in a batch with others.
+        """
+        record = self.detach()
+        start = record.pop('start')
+        record['seconds'] = time.perf_counter() - start if seconds is None else seconds
+        for exporter in self.exporters:
+            exporter(record)
+        return record
+
+
+class json_log_exporter():
+    """Log every document record as one JSON line"""
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('txtrank.metrics')
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, json.dumps(record, sort_keys=True))
+
+
+class prometheus_exporter():
+    """Aggregate document records into Prometheus text format metrics"""
+
+    def __init__(self, prefix='txtrank', buckets=default_buckets, non_additive=non_additive):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.non_additive = set(non_additive)
+        self.lock = threading.Lock()
+        self.documents = 0
+        self.bucket_counts = [0] * len(buckets)
+        self.seconds_sum = 0.0
+        self.stage_seconds = dict()  # stage -> total seconds
+        self.counter_sums = dict()  # counter -> total over documents
+        self.counter_max = dict()  # counter -> largest single document value
+        self.server = None
+
+    def __call__(self, record):
+        with self.lock:
+            self.documents += 1
+            self.seconds_sum += record['seconds']
+            for i, bound in enumerate(self.buckets):
+                if record['seconds'] <= bound:
+                    self.bucket_counts[i] += 1
+            for stage, seconds in record['stages'].items():
+                self.stage_seconds[stage] = self.stage_seconds.get(stage, 0.0) + seconds
+            for name, value in record['counters'].items():
+                self.counter_sums[name] = self.counter_sums.get(name, 0) + value
+                self.counter_max[name] = max(self.counter_max.get(name, value), value)
+
+    def render(self):
+        """Get the metrics in Prometheus text exposition format"""
+        p = self.prefix
+        with self.lock:
+            lines = ['# HELP %s_document_seconds Wall time to analyze one document.' % p,
+                     '# TYPE %s_document_seconds histogram' % p]
+            for bound, count in zip(self.buckets, self.bucket_counts):
+                lines.append('%s_document_seconds_bucket{le="%s"} %d' % (p, '+Inf' if bound == float('inf') else bound,
+                                                                       count))
+            lines.append('%s_document_seconds_sum %r' % (p, self.seconds_sum))
+            lines.append('%s_document_seconds_count %d' % (p, self.documents))
+            lines.append('# HELP %s_stage_seconds_total Time spent in each stage.' % p)
+            lines.append('# TYPE %s_stage_seconds_total counter' % p)
+            for stage, seconds in sorted(self.stage_seconds.items()):
+                lines.append('%s_stage_seconds_total{stage="%s"} %r' % (p, stage, seconds))
+            for name in sorted(self.counter_sums):
+                if name not in self.non_additive:
+                    lines.append('# TYPE %s_%s_total counter' % (p, name))
+                    lines.append('%s_%s_total %r' % (p, name, float(self.counter_sums[name])))
+                lines.append('# TYPE %s_%s_max gauge' % (p, name))
+                lines.append('%s_%s_max %r' % (p, name, float(self.counter_max[name])))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """Write the metrics to path, e.g. for node_exporter's textfile collector"""
+        with open(path + '.tmp', 'w') as f:
+            f.write(self.render())
+        os.replace(path + '.tmp', path)
+
+    def serve(self, port=9108, host='127.0.0.1'):
+        """Serve the metrics on http://host:port/metrics from a daemon thread"""
+        exporter = self
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != '/metrics':
+                    self.send_error(404)
+                    return
+                body = exporter.render().encode('utf8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
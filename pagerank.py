@@ -0,0 +1,79 @@
+from collections import namedtuple
+import numpy as np
+from scipy import sparse
+
+# scores of one graph, iterations it took to converge and its final residual
+solution = namedtuple('solution', ['scores', 'iterations', 'residual'])
+
+
+class pagerank():
+    """Solve the TextRank weighting pr = (1 - d) * p + d * g.pr for one or many graphs"""
+
+    def __init__(self, d=0.85, tol=1e-5, max_iter=100, norm='l1', dtype='float64'):
+        if norm not in ('l1', 'linf'):
+            raise ValueError("norm must be 'l1' or 'linf', not %r" % (norm,))
+        self.d = d  # damping coefficient, usually is .85
+        self.tol = tol  # convergence threshold on the change of a graph's scores
+        self.max_iter = max_iter  # iteration cap, reached only if tol is never met
+        self.norm = norm  # 'l1' sums the per node change, 'linf' takes its maximum
+        self.dtype = np.dtype(dtype)  # float32 halves memory, use a looser tol with it
+
+    def teleport(self, size, personalization=None):
+        """Get teleport vector, scaled so that the uniform one is all ones"""
+        if personalization is None:
+            return np.ones(size, dtype=self.dtype)
+        p = np.asarray(personalization, dtype=self.dtype)
+        if p.shape != (size,):
+            raise ValueError('personalization has shape %r, expected (%d,)' % (p.shape, size))
+        total = p.sum()
+        if total <= 0:
+            return np.ones(size, dtype=self.dtype)
+        return p * (size / total)
+
+    def block_norm(self, diff, starts):
+        """Get the norm of diff within each block beginning at starts"""
+        if self.norm == 'l1':
+            return np.add.reduceat(diff, starts)
+        return np.maximum.reduceat(diff, starts)
+
+    def solve(self, g, personalization=None):
+        """Solve a single column normalized graph"""
+        return self.solve_many([g], [personalization])[0]
+
+    def solve_many(self, graphs, personalizations=None):
+        """Solve many graphs at once as one block diagonal system"""
+        if personalizations is None:
+            personalizations = [None] * len(graphs)
+        sizes = np.array([g.shape[0] for g in graphs], dtype=np.int64)
+        nonempty = sizes > 0
+        # Empty graphs take no room in the block system, so they do not shift the offsets
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))[nonempty]
+        iterations = np.zeros(len(graphs), dtype=np.int64)
+        residual = np.zeros(len(graphs), dtype=self.dtype)
+        pr = np.zeros(0, dtype=self.dtype)
+
+        # Empty graphs are trivially converged
+        active = nonempty.copy()
+        if active.any():
+            g = sparse.block_diag([graphs[i] for i in np.flatnonzero(nonempty)], format='csr', dtype=self.dtype)
+            base = (1 - self.d) * np.concatenate([self.teleport(size, p)
+                                                  for size, p in zip(sizes, personalizations) if size > 0])
+            pr = np.ones(g.shape[0], dtype=self.dtype)
+            for epoch in range(1, self.max_iter + 1):
+                new_pr = base + self.d * g.dot(pr)
+                change = np.zeros(len(graphs), dtype=self.dtype)
+                change[nonempty] = self.block_norm(np.abs(new_pr - pr), starts)
+                iterations[active] = epoch
+                residual[active] = change[active]
+                # Freeze graphs once they have converged
+                pr = np.where(np.repeat(active[nonempty], sizes[nonempty]), new_pr, pr)
+                active &= change >= self.tol
+                if not active.any():
+                    break
+
+        results = []
+        position = 0
+        for size, epochs, res in zip(sizes, iterations, residual):
+            results.append(solution(pr[position:position + size], int(epochs), float(res)))
+            position += size
+        return results
@@ -0,0 +1,126 @@
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+
+# Token attributes txtrank reads back; is_stop lives on the vocab so stop words can change freely
+cached_attrs = ['ORTH', 'POS', 'SENT_START']
+
+
+class parse_cache():
+    """Content addressed cache of spaCy parses, kept in memory in front of a directory"""
+
+    def __init__(self, path, max_bytes=1 << 30, max_memory_bytes=64 << 20):
+        self.path = path  # directory holding one DocBin file per parsed text
+        self.max_bytes = max_bytes  # disk budget, least recently used files are evicted past it
+        self.max_memory_bytes = max_memory_bytes  # budget of the in-memory tier
+        self.memory = OrderedDict()  # key -> serialized DocBin, oldest first
+        self.memory_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(path, exist_ok=True)
+        self.disk_bytes = sum(size for mtime, size, file in self.files())
+
+    def key(self, text, nlp):
+        """Hash text together with the model and the components that parsed it"""
+        model = '%s_%s-%s|%s' % (nlp.meta.get('lang'), nlp.meta.get('name'), nlp.meta.get('version'),
+                                 ','.join(nlp.pipe_names))
+        return hashlib.sha256(model.encode('utf8') + b'\0' + text.encode('utf8')).hexdigest()
+
+    def file(self, key):
+        return os.path.join(self.path, key[:2], key + '.spacy')
+
+    def files(self):
+        """Get (mtime, size, path) of every cached file"""
+        for shard in os.scandir(self.path):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.spacy'):
+                        stat = entry.stat()
+                        yield stat.st_mtime, stat.st_size, entry.path
+
+    def remember(self, key, data):
+        """Put data in the memory tier, dropping the least recently used entries past its budget"""
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_memory_bytes and len(self.memory) > 1:
+            self.memory_bytes -= len(self.memory.popitem(last=False)[1])
+
+    def load(self, key):
+        """Get the serialized parse of key, or None"""
+        data = self.memory.get(key)
+        if data is None:
+            file = self.file(key)
+            try:
+                with open(file, 'rb') as f:
+                    data = f.read()
+                os.utime(file)  # mark as recently used for eviction
+            except FileNotFoundError:
+                self.misses += 1
+                return None
+        self.hits += 1
+        self.remember(key, data)
+        return data
+
+    def store(self, key, doc):
+        """Serialize doc under key to memory and disk"""
+        from spacy.tokens import DocBin
+        data = DocBin(attrs=cached_attrs, docs=[doc]).to_bytes()
+        self.remember(key, data)
+        file = self.file(key)
+        os.makedirs(os.path.dirname(file), exist_ok=True)
+        # Write then rename, so concurrent workers never read a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(file), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, file)
+        self.disk_bytes += len(data)
+        if self.disk_bytes > self.max_bytes:
+            self.evict()
+        return data
+
+    def evict(self):
+        """Delete least recently used files until the cache is back under 90% of max_bytes"""
+        files = sorted(self.files())
+        self.disk_bytes = sum(size for mtime, size, file in files)
+        for mtime, size, file in files:
+            if self.disk_bytes <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(file)
+            except FileNotFoundError:
+                pass
+            self.disk_bytes -= size
+
+    def to_doc(self, data, vocab):
+        from spacy.tokens import DocBin
+        return next(DocBin().from_bytes(data).get_docs(vocab))
+
+    def parse(self, text, nlp):
+        """Get the parse of text, running nlp only if it is not cached"""
+        key = self.key(text, nlp)
+        data = self.load(key)
+        if data is None:
+            doc = nlp(text)
+            self.store(key, doc)
+            return doc
+        return self.to_doc(data, nlp.vocab)
+
+    def pipe(self, texts, nlp, batch_size=64, n_process=1):
+        """Parse texts like nlp.pipe, reusing and filling the cache"""
+        def lookups():
+            for text in texts:
+                key = self.key(text, nlp)
+                data = self.load(key)
+                # Cached texts go through the pipeline as empty docs, so order is kept
+                yield ('' if data is not None else text), (key, data)
+
+        for doc, (key, data) in nlp.pipe(lookups(), as_tuples=True, batch_size=batch_size, n_process=n_process):
+            if data is None:
+                self.store(key, doc)
+                yield doc
+            else:
+                yield self.to_doc(data, nlp.vocab)
@@ -0,0 +1,27 @@
+import threading
+
+# NLTK packages the web-sourced scripts rely on, with the path nltk.data.find looks them up by
+nltk_packages = {
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+    'averaged_perceptron_tagger': 'taggers/averaged_perceptron_tagger',
+}
+nltk_ready = False
+nltk_lock = threading.Lock()
+
+
+def ensure_nltk_data():
+    """Download missing NLTK packages, once per process on first use"""
+    global nltk_ready
+    if nltk_ready:
+        return
+    with nltk_lock:
+        if nltk_ready:
+            return
+        import nltk
+        for package, path in nltk_packages.items():
+            try:
+                nltk.data.find(path)
+            except LookupError:
+                nltk.download(package)
+        nltk_ready = True
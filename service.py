@@ -0,0 +1,238 @@
+import argparse
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import multiprocessing
+import os
+import queue
+import socketserver
+import threading
+import time
+import extractors
+import txtrank
+
+# A request waiting to be batched
+job = namedtuple('job', ['future', 'extractor', 'text', 'number', 'arrival'])
+
+
+def warmup(names):
+    """Load what extract_many needs for the served extractors, only the batch pipeline for txtrank"""
+    extractors.warmup([name for name in names if name != 'txtrank'])
+    if 'txtrank' in names:
+        txtrank.load_pipe_nlp()
+
+
+class batcher():
+    """Collect concurrent requests into micro-batches and run them on a pool of preloaded workers
+
+    A batch is sent once it holds max_batch requests or its first request
+    has waited max_latency seconds. At most max_queue requests wait and at
+    most max_inflight batches run, beyond which submit() raises queue.Full.
+    make_pool() gets a ProcessPoolExecutor, and is called again to replace
+    one broken by a worker dying, e.g. of OOM.
+    """
+
+    def __init__(self, make_pool, max_batch=32, max_latency=0.01, max_queue=1024, max_inflight=8):
+        self.make_pool = make_pool
+        self.pool = make_pool()
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.requests = queue.Queue(max_queue)
+        self.inflight = threading.BoundedSemaphore(max_inflight)
+        self.running = 0  # batches handed to the pool and not finished yet
+        self.lock = threading.Lock()
+        threading.Thread(target=self.loop, daemon=True).start()
+
+    def submit(self, extractor, text, number):
+        """Queue a request, getting a Future of its keywords"""
+        future = Future()
+        self.requests.put_nowait(job(future, extractor, text, number, time.monotonic()))
+        return future
+
+    def collect(self):
+        """Wait for a request, then gather more until the batch is full or due"""
+        first = self.requests.get()
+        batch = [first]
+        # Requests that queued while every batch slot was busy are already due: take them all first
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.requests.get_nowait())
+            except queue.Empty:
+                break
+        deadline = first.arrival + self.max_latency
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def loop(self):
+        while True:
+            groups = dict()
+            for request in self.collect():
+                groups.setdefault((request.extractor, request.number), []).append(request)
+            for (extractor, number), requests in groups.items():
+                # Waiting here lets the queue fill up, which is what pushes back on clients
+                self.inflight.acquire()
+                with self.lock:
+                    self.running += 1
+                try:
+                    future = self.start(extractor, [r.text for r in requests], number)
+                except Exception as e:
+                    # Fail just this batch: the loop must keep running for the requests after it
+                    future = Future()
+                    future.set_exception(e)
+                future.add_done_callback(partial(self.done, requests))
+
+    def start(self, extractor, texts, number):
+        """Submit a batch to the pool, replacing the pool if a worker death broke it"""
+        try:
+            return self.pool.submit(extractors.extract_many, extractor, texts, number)
+        except BrokenProcessPool:
+            # The batches that were running on it have already failed with BrokenProcessPool
+            self.pool.shutdown(wait=False)
+            self.pool = self.make_pool()
+            return self.pool.submit(extractors.extract_many, extractor, texts, number)
+
+    def done(self, requests, future):
+        with self.lock:
+            self.running -= 1
+        self.inflight.release()
+        error = future.exception()
+        for i, request in enumerate(requests):
+            if error is None:
+                request.future.set_result(future.result()[i])
+            else:
+                request.future.set_exception(error)
+
+
+def make_handler(batch, names, timeout=30.0):
+    """Get a request handler class serving batch"""
+
+    class handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def reply(self, status, body, headers=()):
+            data = json.dumps(body).encode('utf8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for header in headers:
+                self.send_header(*header)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != '/health':
+                return self.reply(404, {'error': 'not found'})
+            self.reply(200, {'queue': batch.requests.qsize(), 'running': batch.running, 'extractors': names})
+
+        def do_POST(self):
+            if self.path != '/keywords':
+                return self.reply(404, {'error': 'not found'})
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                text = request['text']
+                extractor = request.get('extractor', names[0])
+                number = int(request.get('number', 10))
+                if not isinstance(text, str) or extractor not in names:
+                    raise ValueError('text must be a string and extractor one of %s' % ', '.join(names))
+            except (ValueError, KeyError, TypeError) as e:
+                return self.reply(400, {'error': str(e)})
+            try:
+                future = batch.submit(extractor, text, number)
+            except queue.Full:
+                return self.reply(503, {'error': 'queue full'}, [('Retry-After', '1')])
+            try:
+                keywords = future.result(timeout)
+            except TimeoutError:
+                return self.reply(504, {'error': 'timed out'})
+            except Exception as e:
+                return self.reply(500, {'error': repr(e)})
+            self.reply(200, {'keywords': keywords})
+
+        def address_string(self):
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def log_message(self, format, *args):
+            pass
+
+    return handler
+
+
+class backlog_server():
+    """Listen with a backlog of the given size instead of socketserver's 5
+
+    With a backlog shorter than the request queue, a burst of clients
+    overflows it and gets reset or waits out a SYN retransmit.
+    """
+
+    def __init__(self, address, handler, backlog=1024):
+        self.request_queue_size = backlog
+        super().__init__(address, handler)
+
+
+class http_server(backlog_server, ThreadingHTTPServer):
+    pass
+
+
+class unix_server(backlog_server, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(names=('txtrank', 'rake'), host='127.0.0.1', port=8080, unix_socket=None, workers=None,
+          max_batch=32, max_latency=0.01, max_queue=1024, timeout=30.0):
+    """Serve POST /keywords and GET /health until interrupted"""
+    names = list(names)
+    # Load models before forking, so every worker shares them from the start
+    warmup(names)
+    workers = workers or os.cpu_count() or 1
+    make_pool = partial(ProcessPoolExecutor, workers, multiprocessing.get_context('fork'), warmup, (names,))
+    batch = batcher(make_pool, max_batch, max_latency, max_queue, max_inflight=2 * workers)
+    # With fork every worker starts on the first submit: do it now, so a failing warmup
+    # stops the service here and the workers do not inherit the listening socket
+    batch.pool.submit(len, ()).result()
+    handler = make_handler(batch, names, timeout)
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = unix_server(unix_socket, handler, max_queue)
+    else:
+        server = http_server((host, port), handler, max_queue)
+    # Workers replacing ones that died are forked from here on, and must not hold the port open
+    os.register_at_fork(after_in_child=server.socket.close)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batch.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve keyword extraction over HTTP/JSON')
+    parser.add_argument('-e', '--extractor', action='append', dest='extractors',
+                        choices=sorted(extractors.extractors), help='may be repeated, default txtrank and rake')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix-socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='worker processes, default one per CPU')
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-latency', type=float, default=0.01, help='seconds a request may wait for a batch')
+    parser.add_argument('--max-queue', type=int, default=1024, help='waiting requests before answering 503')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    args = parser.parse_args(argv)
+    serve(args.extractors or ['txtrank', 'rake'], args.host, args.port, args.unix_socket, args.workers,
+          args.max_batch, args.max_latency, args.max_queue, args.timeout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+import json
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+# Generous, so only a model load or NLTK download at import time trips it
+max_import_seconds = 5.0
+
+
+def cold_import():
+    """Import the keyword scripts in a fresh interpreter, getting the seconds taken and heavy modules loaded"""
+    code = ('import json, sys, time; start = time.perf_counter(); import txtrank, textRank, topicRank; '
+            'seconds = time.perf_counter() - start; '
+            'print(json.dumps([seconds, [m for m in ("spacy", "nltk") if m in sys.modules]]))')
+    return json.loads(subprocess.check_output([sys.executable, '-c', code], cwd=here))
+
+
+def test_import_loads_no_models():
+    seconds, loaded = cold_import()
+    assert loaded == []
+
+
+def test_import_time():
+    seconds, loaded = cold_import()
+    assert seconds < max_import_seconds
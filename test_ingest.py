@@ -0,0 +1,55 @@
+import asyncio
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import threading
+import ingest
+
+page = '''<html><head><title>Ariyanandhi v. Mohamed Sideek</title></head><body><article>
+<p>The plaintiff filed this action for a declaration of title to premises No. 75, Sea Street, Galle,
+for ejectment of the defendant from the said premises and for damages.</p>
+<p>The learned District Judge held that the defendant was not entitled to occupy the premises as there
+was no written notice and no fresh contract of tenancy with the landlord.</p>
+</article></body></html>
+'''
+
+
+def serve(directory):
+    """Serve directory on a free local port, recording the status of every response"""
+    statuses = []
+
+    class handler(SimpleHTTPRequestHandler):
+        def send_response(self, code, message=None):
+            statuses.append(code)
+            super().send_response(code, message)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, statuses
+
+
+def test_run_writes_keywords_and_revalidates_cache(tmp_path):
+    site = tmp_path / 'site'
+    site.mkdir()
+    (site / 'judgment.html').write_text(page)
+    server, statuses = serve(str(site))
+    url = 'http://127.0.0.1:%d/judgment.html' % server.server_address[1]
+    try:
+        records = []
+        for i in range(2):
+            output = io.StringIO()
+            asyncio.run(ingest.run([url], 'rake', output, cache_dir=str(tmp_path / 'cache'), workers=1))
+            records.append([json.loads(line) for line in output.getvalue().splitlines()])
+    finally:
+        server.shutdown()
+        server.server_close()
+    first, second = records
+    assert len(first) == 1
+    assert first[0]['url'] == url and first[0]['extractor'] == 'rake'
+    assert len(first[0]['keywords']) == 5
+    assert second == first
+    assert statuses == [200, 304]
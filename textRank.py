@@ -1,19 +1,50 @@
-import nltk
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-import trafilatura
+from collections import defaultdict
+import importlib
+from chunks import sentence_chunks
+from resources import ensure_nltk_data
+
+chunk_chars = 5000  # longest text handed to the extractor in one go
+
 array_links = [
     "http://www.commonlii.org/lk/cases/LKCA/1872/1.html"
 ]
-array_text = []
-for l in array_links:
-    html = trafilatura.fetch_url(l)
-    text = trafilatura.extract(html)
-    text_clean = text.replace("\n", " ").replace("\'", "")
-    array_text.append(text_clean[0:5000])
 
-from summa import keywords
-for j in range(len(array_text)):
-    print("Keywords of article", str(j+1), "\n", (keywords.keywords(array_text[j], words=5)).split("\n"))
 
+def get_texts(links):
+    """Fetch the links concurrently and get their cleaned texts"""
+    import asyncio
+    from ingest import fetch_all
+    return asyncio.run(fetch_all(links))
+
+
+def get_keywords(text, words=5):
+    """Get top keywords of text with summa's TextRank
+
+    Texts longer than chunk_chars are ranked chunk by chunk, summing each
+    keyword's scores weighted by the length of its chunk, as summa normalizes
+    scores within a chunk and a short tail would otherwise count as much as
+    a full one.
+    """
+    from summa import keywords
+    chunks = list(sentence_chunks(text, chunk_chars))
+    if len(chunks) <= 1:
+        # summa can return more than words keywords once it joins adjacent ones
+        return keywords.keywords(text, words=words).split("\n")[:words]
+    scores = defaultdict(float)
+    for chunk in chunks:
+        for keyword, score in keywords.keywords(chunk, scores=True):
+            scores[keyword] += score * len(chunk)
+    return sorted(scores, key=scores.get, reverse=True)[:words]
+
+
+def warmup():
+    """Load NLTK data and summa up front, e.g. in a server before it forks workers"""
+    ensure_nltk_data()
+    importlib.import_module('summa.keywords')
+
+
+if __name__ == '__main__':
+    ensure_nltk_data()
+    array_text = get_texts(array_links)
+    for j in range(len(array_text)):
+        print("Keywords of article", str(j+1), "\n", get_keywords(array_text[j], words=5))
@@ -1,18 +1,50 @@
-import nltk
-nltk.download('stopwords')
-nltk.download('punkt')
-nltk.download('averaged_perceptron_tagger')
-import trafilatura
+from collections import defaultdict
+import importlib
+from chunks import sentence_chunks
+from resources import ensure_nltk_data
+
+chunk_chars = 5000  # longest text handed to the extractor in one go
+
 array_links = [
     "http://www.commonlii.org/lk/cases/LKCA/1872/1.html"
 ]
-array_text = []
-for l in array_links:
-    html = trafilatura.fetch_url(l)
-    text = trafilatura.extract(html)
-    text_clean = text.replace("\n", " ").replace("\'", "")
-    array_text.append(text_clean[0:5000])
-from pytopicrank import TopicRank
-for j in range(len(array_text)):
-    tr = TopicRank(array_text[j])
-    print("Keywords of article", str(j+1), "\n", tr.get_top_n(n=5, extract_strategy='first'))
\ No newline at end of file
+
+
+def get_texts(links):
+    """Fetch the links concurrently and get their cleaned texts"""
+    import asyncio
+    from ingest import fetch_all
+    return asyncio.run(fetch_all(links))
+
+
+def get_keywords(text, n=5):
+    """Get top keywords of text with pytopicrank
+
+    Texts longer than chunk_chars are ranked chunk by chunk, scoring each
+    keyword by the sum of its reciprocal ranks.
+    """
+    ensure_nltk_data()
+    from pytopicrank import TopicRank
+    chunks = list(sentence_chunks(text, chunk_chars))
+    if len(chunks) <= 1:
+        tr = TopicRank(text)
+        return tr.get_top_n(n=n, extract_strategy='first')
+    scores = defaultdict(float)
+    for chunk in chunks:
+        tr = TopicRank(chunk)
+        for rank, keyword in enumerate(tr.get_top_n(n=n, extract_strategy='first')):
+            scores[keyword] += 1.0 / (rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:n]
+
+
+def warmup():
+    """Load NLTK data and pytopicrank up front, e.g. in a server before it forks workers"""
+    ensure_nltk_data()
+    importlib.import_module('pytopicrank')
+
+
+if __name__ == '__main__':
+    ensure_nltk_data()
+    array_text = get_texts(array_links)
+    for j in range(len(array_text)):
+        print("Keywords of article", str(j+1), "\n", get_keywords(array_text[j], n=5))
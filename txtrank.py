@@ -1,25 +1,101 @@
 from collections import OrderedDict
+import threading
+import time
 import numpy as np
-import spacy
-from spacy.lang.en.stop_words import STOP_WORDS
+from scipy import sparse
+from pagerank import pagerank
+from chunks import read_chunks
 
-nlp = spacy.load('en_core_web_sm')
+model_name = 'en_core_web_sm'
+pipelines = dict()  # 'nlp' / 'pipe_nlp' -> spaCy pipeline, loaded on first use
+pipelines_lock = threading.Lock()
+applied_stopwords = dict()  # id(vocab) -> words already flagged as stop words
+
+
+def build_nlp(kind):
+    """Load the full pipeline, or for 'pipe_nlp' one without NER or lemmatizer and senter instead of parser"""
+    import spacy
+    if kind == 'nlp':
+        return spacy.load(model_name)
+    pipe_nlp = spacy.load(model_name, exclude=['ner', 'lemmatizer'])
+    # TextRank only needs POS tags and sentence boundaries
+    if 'senter' in pipe_nlp.component_names:
+        pipe_nlp.remove_pipe('parser')
+        pipe_nlp.enable_pipe('senter')
+    return pipe_nlp
+
+
+def get_pipeline(kind):
+    """Get a pipeline, loading it once per process on first use"""
+    pipeline = pipelines.get(kind)
+    if pipeline is None:
+        with pipelines_lock:
+            pipeline = pipelines.get(kind)
+            if pipeline is None:
+                pipeline = pipelines[kind] = build_nlp(kind)
+    return pipeline
+
+
+def load_nlp():
+    """Get the full pipeline used by txtrank.analyze"""
+    return get_pipeline('nlp')
+
+
+def load_pipe_nlp():
+    """Get the lighter pipeline used by txtrank.analyze_many"""
+    return get_pipeline('pipe_nlp')
+
+
+def get_stop_words():
+    """Get spaCy's English stop words"""
+    from spacy.lang.en.stop_words import STOP_WORDS
+    return STOP_WORDS
+
+
+def warmup(batch=False):
+    """Load a pipeline up front, e.g. in a server before it forks workers
+
+    Only the pipeline that will be used is loaded, the full one for analyze
+    or with batch=True the lighter one for analyze_many, as each holds its
+    own copy of the model.
+    """
+    if batch:
+        load_pipe_nlp()
+    else:
+        load_nlp()
+
+
+def __getattr__(name):
+    # Keep `txtrank.nlp` working without loading the model at import time
+    if name == 'nlp':
+        return load_nlp()
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 class txtrank():
     """Extract keywords from text"""
 
-    def __init__(self):
+    def __init__(self, cache=None, metrics=None):
+        self.cache = cache  # optional parse_cache, so re-ranking skips spaCy
+        self.metrics = metrics  # optional metrics.instrument, None costs nothing
         self.d = 0.85  # damping coefficient, usually is .85
-        self.min_diff = 1e-5  # convergence threshold
-        self.steps = 10  # iteration steps
+        self.min_diff = 1e-5  # convergence threshold on the per node change
+        self.steps = 100  # maximum iteration steps
+        self.norm = 'l1'  # norm of the per node change, 'l1' or 'linf'
+        self.dtype = 'float64'  # float32 halves the solver memory
         self.node_weight = None  # save keywords and its weight
+        self.iterations = None  # iterations the last document took to converge
+        self.residual = None  # change of the weights in its final iteration
 
-    def set_stopwords(self, stopwords):
+    def set_stopwords(self, stopwords, vocab=None):
         """Set stop words"""
-        for word in STOP_WORDS.union(set(stopwords)):
-            lexeme = nlp.vocab[word]
+        vocab = load_nlp().vocab if vocab is None else vocab
+        # Lexeme flags persist in the vocab, so only flag words not seen before
+        applied = applied_stopwords.setdefault(id(vocab), set())
+        for word in get_stop_words().union(set(stopwords)) - applied:
+            lexeme = vocab[word]
             lexeme.is_stop = True
+            applied.add(word)
 
     def sentence_segment(self, doc, candidate_pos, lower):
         """Store those words only in cadidate_pos"""
@@ -39,48 +115,56 @@ class txtrank():
     def get_vocab(self, sentences):
         """Get all tokens"""
         vocab = OrderedDict()
-        i = 0
         for sentence in sentences:
             for word in sentence:
                 if word not in vocab:
-                    vocab[word] = i
-                    i += 1
+                    vocab[word] = len(vocab)
         return vocab
 
-    def get_token_pairs(self, window_size, sentences):
-        """Build token_pairs from windows in sentences"""
-        token_pairs = list()
-        for sentence in sentences:
-            for i, word in enumerate(sentence):
-                for j in range(i + 1, i + window_size):
-                    if j >= len(sentence):
-                        break
-                    pair = (word, sentence[j])
-                    if pair not in token_pairs:
-                        token_pairs.append(pair)
-        return token_pairs
+    def get_token_ids(self, vocab, sentences):
+        """Intern tokens as integer ids, with the sentence each one belongs to"""
+        lengths = np.fromiter((len(sentence) for sentence in sentences), dtype=np.int64, count=len(sentences))
+        token_ids = np.fromiter((vocab[word] for sentence in sentences for word in sentence),
+                                dtype=np.int64, count=int(lengths.sum()))
+        sentence_ids = np.repeat(np.arange(len(sentences), dtype=np.int64), lengths)
+        return token_ids, sentence_ids
+
+    def get_token_pairs(self, window_size, token_ids, sentence_ids):
+        """Build unique (row, col) token_pairs from windows in sentences"""
+        vocab_size = int(token_ids.max()) + 1 if len(token_ids) else 1
+        codes = []
+        for offset in range(1, window_size):
+            # Pair every token with the one `offset` places later in the same sentence
+            same_sentence = sentence_ids[:-offset] == sentence_ids[offset:]
+            codes.append(token_ids[:-offset][same_sentence] * vocab_size + token_ids[offset:][same_sentence])
+        codes = np.unique(np.concatenate(codes)) if codes else np.empty(0, dtype=np.int64)
+        return codes // vocab_size, codes % vocab_size
 
     def symmetrize(self, a):
-        return a + a.T - np.diag(a.diagonal())
+        return a + a.T - sparse.diags(a.diagonal())
 
     def get_matrix(self, vocab, token_pairs):
         """Get normalized matrix"""
         # Build matrix
         vocab_size = len(vocab)
-        g = np.zeros((vocab_size, vocab_size), dtype='float')
-        for word1, word2 in token_pairs:
-            i, j = vocab[word1], vocab[word2]
-            g[i][j] = 1
+        rows, cols = token_pairs
+        g = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(vocab_size, vocab_size))
 
         # Get Symmeric matrix
-        g = self.symmetrize(g)
+        g = self.symmetrize(g).tocsr()
+        g.eliminate_zeros()
 
         # Normalize matrix by column
-        norm = np.sum(g, axis=0)
-        g_norm = np.divide(g, norm, where=norm != 0)  # this is ignore the 0 element in norm
+        norm = np.asarray(g.sum(axis=0)).ravel()
+        inv_norm = np.divide(1.0, norm, out=np.zeros_like(norm), where=norm != 0)  # this is ignore the 0 element in norm
+        g_norm = (g @ sparse.diags(inv_norm)).tocsr()
 
         return g_norm
 
+    def top_keywords(self, number=10):
+        """Get top number (keyword, weight) pairs"""
+        return sorted(self.node_weight.items(), key=lambda t: t[1], reverse=True)[:number]
+
     def get_keywords(self, number=10):
         """Print top number keywords"""
         node_weight = OrderedDict(sorted(self.node_weight.items(), key=lambda t: t[1], reverse=True))
@@ -89,47 +173,257 @@ class txtrank():
             if i > number:
                 break
 
+    def parse(self, text):
+        """Parse text with the full pipeline, through the cache if there is one"""
+        if self.cache is None:
+            return load_nlp()(text)
+        return self.cache.parse(text, load_nlp())
+
+    def timed(self, stage, function, *args):
+        """Call function(*args), timing it as stage when instrumented"""
+        if self.metrics is None:
+            return function(*args)
+        return self.metrics.timed(stage, function, *args)
+
+    def count_graph(self, sentences, candidate_tokens, vocab, token_pairs, g):
+        """Record the size of a document's graph when instrumented"""
+        if self.metrics is not None:
+            self.metrics.count(sentences=sentences, candidate_tokens=candidate_tokens, vocab_size=len(vocab),
+                               unique_pairs=len(token_pairs[0]), matrix_nnz=int(g.nnz),
+                               matrix_bytes=int(g.data.nbytes + g.indices.nbytes + g.indptr.nbytes))
+
+    def get_graph(self, doc, candidate_pos, window_size, lower):
+        """Get vocabulary and normalized matrix of a parsed doc"""
+
+        # Filter sentences
+        sentences = self.timed('sentence_segment', self.sentence_segment, doc, candidate_pos, lower)
+
+        # Build vocabulary
+        vocab = self.timed('get_vocab', self.get_vocab, sentences)
+
+        # Get token_pairs from windows
+        token_ids, sentence_ids = self.timed('get_token_ids', self.get_token_ids, vocab, sentences)
+        token_pairs = self.timed('get_token_pairs', self.get_token_pairs, window_size, token_ids, sentence_ids)
+
+        # Get normalized matrix
+        g = self.timed('get_matrix', self.get_matrix, vocab, token_pairs)
+
+        self.count_graph(len(sentences), len(token_ids), vocab, token_pairs, g)
+        return vocab, g
+
+    def get_personalization(self, vocab, personalization):
+        """Get teleport weights for vocab, words not in personalization keep weight 1"""
+        if personalization is None:
+            return None
+        return np.array([personalization.get(word, 1.0) for word in vocab])
+
+    def get_solver(self):
+        """Get PageRank solver for the current settings"""
+        return pagerank(d=self.d, tol=self.min_diff, max_iter=self.steps, norm=self.norm, dtype=self.dtype)
+
+    def get_node_weight(self, vocab, result):
+        """Get weight for each node"""
+        self.iterations = result.iterations
+        self.residual = result.residual
+        if self.metrics is not None:
+            self.metrics.count(iterations=result.iterations, residual=result.residual)
+        node_weight = dict()
+        for word, index in vocab.items():
+            node_weight[word] = result.scores[index]
+        return node_weight
+
+    def rank(self, doc, candidate_pos, window_size, lower, personalization=None):
+        """Get weight for each node of a parsed doc"""
+        vocab, g = self.get_graph(doc, candidate_pos, window_size, lower)
+        result = self.timed('iteration', self.get_solver().solve, g, self.get_personalization(vocab, personalization))
+        return self.get_node_weight(vocab, result)
+
     def analyze(self, text,
                 candidate_pos=['NOUN', 'PROPN'],
-                window_size=4, lower=False, stopwords=list()):
-        """Main function to analyze text"""
+                window_size=4, lower=False, stopwords=list(),
+                personalization=None):
+        """Main function to analyze text
+
+        personalization optionally maps words, e.g. from section headings or
+        statute names, to teleport weights that boost them in the ranking.
+        """
+
+        if self.metrics is not None:
+            self.metrics.begin()
 
         # Set stop words
         self.set_stopwords(stopwords)
 
         # Pare text by spaCy
-        doc = nlp(text)
+        doc = self.timed('nlp', self.parse, text)
 
-        # Filter sentences
-        sentences = self.sentence_segment(doc, candidate_pos, lower)  # list of list of words
+        self.node_weight = self.rank(doc, candidate_pos, window_size, lower, personalization)
 
-        # Build vocabulary
-        vocab = self.get_vocab(sentences)
+        if self.metrics is not None:
+            self.metrics.count(characters=len(text))
+            self.metrics.finish()
 
-        # Get token_pairs from windows
-        token_pairs = self.get_token_pairs(window_size, sentences)
+    def analyze_many(self, texts,
+                     candidate_pos=['NOUN', 'PROPN'],
+                     window_size=4, lower=False, stopwords=list(),
+                     personalization=None, batch_size=64, n_process=1):
+        """Analyze an iterable of texts, yielding the node weights of each one in order
 
-        # Get normalized matrix
-        g = self.get_matrix(vocab, token_pairs)
+        Each batch of documents is ranked together as one block diagonal system.
+        """
+        pipeline = load_pipe_nlp()
+        solver = self.get_solver()
 
-        # Initionlization for weight(pagerank value)
-        pr = np.array([1] * len(vocab))
+        # Set stop words once for the whole stream
+        self.set_stopwords(stopwords, pipeline.vocab)
 
-        # Iteration
-        previous_pr = 0
-        for epoch in range(self.steps):
-            pr = (1 - self.d) + self.d * np.dot(g, pr)
-            if abs(previous_pr - sum(pr)) < self.min_diff:
+        # Pare texts by spaCy in batches, optionally across processes
+        if self.cache is None:
+            docs = pipeline.pipe(texts, batch_size=batch_size, n_process=n_process)
+        else:
+            docs = self.cache.pipe(texts, pipeline, batch_size=batch_size, n_process=n_process)
+        docs = iter(docs)
+        graphs = []
+        parse_seconds = 0.0  # spent in spaCy on the documents of graphs
+        while True:
+            start = time.perf_counter()
+            doc = next(docs, None)
+            parse_seconds += time.perf_counter() - start
+            if doc is None:
                 break
+            if self.metrics is not None:
+                self.metrics.begin()
+            vocab, g = self.get_graph(doc, candidate_pos, window_size, lower)
+            if self.metrics is not None:
+                self.metrics.count(characters=len(doc.text))
+            graphs.append((vocab, g, None if self.metrics is None else self.metrics.detach()))
+            if len(graphs) == batch_size:
+                yield from self.solve_graphs(solver, graphs, personalization, parse_seconds)
+                graphs = []
+                parse_seconds = 0.0
+        yield from self.solve_graphs(solver, graphs, personalization, parse_seconds)
+
+    def solve_graphs(self, solver, graphs, personalization, parse_seconds=0.0):
+        """Rank a batch of (vocab, matrix, metrics record) graphs, yielding the node weights of each one"""
+        start = time.perf_counter()
+        results = solver.solve_many([g for vocab, g, record in graphs],
+                                    [self.get_personalization(vocab, personalization) for vocab, g, record in graphs])
+        seconds = time.perf_counter() - start
+        characters = sum(record['counters']['characters'] for vocab, g, record in graphs if record is not None)
+        for (vocab, g, record), result in zip(graphs, results):
+            if record is None:
+                yield self.get_node_weight(vocab, result)
+                continue
+            self.metrics.attach(record)
+            # spaCy parses a whole batch on the first next(), so its time is shared out by length,
+            # and the batch is solved at once, so each document gets an equal share of that
+            share = record['counters']['characters'] / characters if characters else 1.0 / len(graphs)
+            self.metrics.add('nlp', parse_seconds * share)
+            self.metrics.add('iteration', seconds / len(graphs))
+            node_weight = self.get_node_weight(vocab, result)
+            self.metrics.finish(sum(record['stages'].values()))
+            yield node_weight
+
+    def stream_sentences(self, source,
+                         candidate_pos=['NOUN', 'PROPN'],
+                         lower=False, stopwords=list(), chunk_size=100000):
+        """Parse source in sentence aligned chunks, yielding the filtered sentences of each chunk
+
+        source is a file object, a string or an iterable of pages. Only about
+        chunk_size characters are parsed at a time: the last, possibly
+        unfinished, sentence of a chunk is carried over into the next one.
+        """
+        pipeline = load_pipe_nlp()
+        self.set_stopwords(stopwords, pipeline.vocab)
+        carry = ''
+        for chunk in read_chunks(source, chunk_size):
+            doc = self.timed('nlp', pipeline, carry + chunk)
+            last = list(doc.sents)[-1] if len(doc) else None
+            # A chunk holding a single sentence is not carried, so the carry stays bounded
+            if last is None or last.start == 0:
+                carry = ''
+                yield self.timed('sentence_segment', self.sentence_segment, doc, candidate_pos, lower)
             else:
-                previous_pr = sum(pr)
+                carry = last.text_with_ws
+                yield self.timed('sentence_segment', self.sentence_segment, doc[:last.start], candidate_pos, lower)
+        if carry:
+            doc = self.timed('nlp', pipeline, carry)
+            yield self.timed('sentence_segment', self.sentence_segment, doc, candidate_pos, lower)
 
-        # Get weight for each node
-        node_weight = dict()
-        for word, index in vocab.items():
-            node_weight[word] = pr[index]
+    def analyze_stream(self, source,
+                       candidate_pos=['NOUN', 'PROPN'],
+                       window_size=4, lower=False, stopwords=list(),
+                       personalization=None, chunk_size=100000):
+        """Analyze a document too long to hold at once, read from a file object or an iterable of pages"""
+        if self.metrics is not None:
+            self.metrics.begin()
+        graph = stream_graph(self, window_size)
+        for sentences in self.stream_sentences(source, candidate_pos, lower, stopwords, chunk_size):
+            graph.add_sentences(sentences)
+        self.node_weight = graph.rank(personalization)
+        if self.metrics is not None:
+            self.metrics.finish()
+        return graph
+
+
+class stream_graph():
+    """Co-occurrence graph that sentences are merged into as they stream in"""
+
+    def __init__(self, ranker, window_size=4, buffer_size=1 << 20):
+        self.ranker = ranker  # txtrank whose graph and solver settings are used
+        self.window_size = window_size
+        self.buffer_size = buffer_size  # unmerged pairs to hold before deduplicating
+        self.vocab = OrderedDict()
+        self.rows = np.empty(0, dtype=np.int64)
+        self.cols = np.empty(0, dtype=np.int64)
+        self.pending = []  # (rows, cols) not yet merged into the edges
+        self.pending_size = 0
+        self.sentences = 0  # sentences and candidate tokens added so far
+        self.tokens = 0
 
-        self.node_weight = node_weight
+    def add_vocab(self, sentences):
+        """Give every new word of sentences the next id"""
+        for sentence in sentences:
+            for word in sentence:
+                if word not in self.vocab:
+                    self.vocab[word] = len(self.vocab)
+
+    def add_sentences(self, sentences):
+        """Add the token pairs of sentences, lists of words as from sentence_segment"""
+        self.ranker.timed('get_vocab', self.add_vocab, sentences)
+        token_ids, sentence_ids = self.ranker.timed('get_token_ids', self.ranker.get_token_ids, self.vocab, sentences)
+        rows, cols = self.ranker.timed('get_token_pairs', self.ranker.get_token_pairs,
+                                       self.window_size, token_ids, sentence_ids)
+        self.sentences += len(sentences)
+        self.tokens += len(token_ids)
+        self.pending.append((rows, cols))
+        self.pending_size += len(rows)
+        if self.pending_size > self.buffer_size:
+            self.merge()
+
+    def merge(self):
+        """Deduplicate pending pairs into the edges"""
+        if not self.pending:
+            return
+        vocab_size = max(len(self.vocab), 1)
+        codes = np.unique(np.concatenate([self.rows * vocab_size + self.cols] +
+                                         [rows * vocab_size + cols for rows, cols in self.pending]))
+        self.rows, self.cols = codes // vocab_size, codes % vocab_size
+        self.pending = []
+        self.pending_size = 0
+
+    def get_matrix(self):
+        """Get normalized matrix of everything added so far"""
+        self.ranker.timed('get_token_pairs', self.merge)
+        g = self.ranker.timed('get_matrix', self.ranker.get_matrix, self.vocab, (self.rows, self.cols))
+        self.ranker.count_graph(self.sentences, self.tokens, self.vocab, (self.rows, self.cols), g)
+        return g
+
+    def rank(self, personalization=None):
+        """Get weight for each node of everything added so far"""
+        result = self.ranker.timed('iteration', self.ranker.get_solver().solve, self.get_matrix(),
+                                   self.ranker.get_personalization(self.vocab, personalization))
+        return self.ranker.get_node_weight(self.vocab, result)
 
 text = '''The plaintiff filed this action for a declaration of title to premises No. 75, Sea Street, Galle, for ejectment of the defendant from the said premises and for damages at the rate of Rs. 30/- per month from 3.5.66 until restoration of possession.
  One Amaradasa had been the owner of the premises and Lucihamy was in occupation of it as his tenant. In April 1964, Amaradasa sold and conveyed the premises to the plaintiff for a consideration provided by A. M. N. Sideek, the father of the plaintiff. The plaintiff was at the time a student in the H.S.C. class.
@@ -202,6 +496,8 @@ https://www.lawlanka.com/lal/pages/popUp/printNLRCaseReportPopUp.jsp?caseId=NLR8
 shall, if such action or proceedings is or are pending on the date of commencement of this Act, be deemed at all times to have been and to be null and void;
 Accordingly I allow the appeal, set aside the judgment and decree of the District Court and direct that order be entered dismissing plaintiff's action. The defendant-appellant will be entitled to her costs in both Courts.
 '''
-tr4w = txtrank()
-tr4w.analyze(text, candidate_pos = ['NOUN', 'PROPN'], window_size=4, lower=False)
-tr4w.get_keywords(10)
\ No newline at end of file
+
+if __name__ == '__main__':
+    tr4w = txtrank()
+    tr4w.analyze(text, candidate_pos = ['NOUN', 'PROPN'], window_size=4, lower=False)
+    tr4w.get_keywords(10)